@@ -1,25 +1,177 @@
-import json
+import hashlib
 import os
-from difflib import SequenceMatcher
-from typing import List, Tuple, Dict
+from functools import lru_cache
+from typing import List, Tuple, Dict, Optional, Sequence
+import joblib
 import numpy as np
+import orjson
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+try:
+    from rapidfuzz import process
+    from rapidfuzz.distance import Indel, Levenshtein
+except ImportError:  # Fall back to the edit-distance kernels below
+    process = None
+
+# Numba only speeds up the fallback kernels, so skip its slow import when RapidFuzz is present
+njit = None
+if process is None:
+    try:
+        from numba import njit
+    except ImportError:
+        pass
+
+# Settings of the character n-gram TF-IDF model
+TFIDF_PARAMS = {
+    "analyzer": 'char',
+    "ngram_range": (1, 3),
+    "norm": 'l2',
+    "sublinear_tf": True,
+    # float32 halves the matrix and the memory traffic of the similarity dot product
+    "dtype": np.float32
+}
+
+# Suffix of the fitted TF-IDF model persisted next to each names file
+TFIDF_CACHE_SUFFIX = ".tfidf_cache.joblib"
+
+# Number of distinct (query, method, top_k) results kept per matcher
+MATCH_CACHE_SIZE = 512
+
+# add_name appends TF-IDF rows incrementally and refits the vocabulary
+# whenever the dataset size reaches a multiple of this
+TFIDF_REFIT_INTERVAL = 128
+
+# Below this many names the thread start-up of a parallel cdist costs more than it saves
+PARALLEL_MIN_NAMES = 10000
+
+# Weights of the sequence (Indel) and Levenshtein scores in the combined method
+SEQUENCE_WEIGHT = 0.6
+LEVENSHTEIN_WEIGHT = 0.4
+
+# The levenshtein and combined methods score names in chunks of this size,
+# most promising lengths first, and stop once no remaining name can rank
+SCORE_CHUNK_SIZE = 256
+
+# Slack applied to score cutoffs so names tying the k-th score are never cut off;
+# RapidFuzz can reject a score sitting exactly on score_cutoff
+TIE_TOLERANCE = 1e-6
+
+def _levenshtein_length_bound(query_len: int, lengths: np.ndarray) -> np.ndarray:
+    """Upper bound on Levenshtein similarity given only the string lengths"""
+    longest = np.maximum(lengths, query_len)
+    return np.where(longest == 0, 1.0, np.minimum(lengths, query_len) / np.maximum(longest, 1))
+
+def _combined_length_bound(query_len: int, lengths: np.ndarray) -> np.ndarray:
+    """Upper bound on the combined score given only the string lengths"""
+    total = lengths + query_len
+    # The Indel ratio is at most 2 * min(len) / (len1 + len2)
+    seq_bound = np.where(total == 0, 1.0, 2 * np.minimum(lengths, query_len) / np.maximum(total, 1))
+    return (seq_bound * SEQUENCE_WEIGHT) + (_levenshtein_length_bound(query_len, lengths) * LEVENSHTEIN_WEIGHT)
+
+def _edit_distance_py(s1: str, s2: str, substitution_cost: int = 1) -> int:
+    """Wagner-Fischer edit distance; substitution_cost=2 gives the Indel distance"""
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    
+    if len(s2) == 0:
+        return len(s1)
+    
+    # One row updated in place; diagonal and left carry the cells it overwrites
+    row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1):
+        diagonal = row[0]
+        left = row[0] = i + 1
+        for j, c2 in enumerate(s2, 1):
+            above = row[j]
+            best = diagonal if c1 == c2 else diagonal + substitution_cost
+            if above + 1 < best:
+                best = above + 1
+            if left + 1 < best:
+                best = left + 1
+            row[j] = left = best
+            diagonal = above
+    
+    return row[-1]
+
+if njit is not None:
+    @njit(cache=True)
+    def _edit_distance_kernel(a, b, substitution_cost):
+        """Compiled Wagner-Fischer over code point arrays with one reused row"""
+        if len(a) < len(b):
+            a, b = b, a
+        row = np.empty(len(b) + 1, dtype=np.int32)
+        for j in range(len(b) + 1):
+            row[j] = j
+        for i in range(len(a)):
+            diagonal = row[0]
+            row[0] = i + 1
+            for j in range(len(b)):
+                above = row[j + 1]
+                best = diagonal if a[i] == b[j] else diagonal + substitution_cost
+                if above + 1 < best:
+                    best = above + 1
+                if row[j] + 1 < best:
+                    best = row[j] + 1
+                row[j + 1] = best
+                diagonal = above
+        return row[len(b)]
+    
+    def _edit_distance(s1: str, s2: str, substitution_cost: int = 1) -> int:
+        """Edit distance via the compiled kernel"""
+        a = np.frombuffer(s1.encode('utf-32-le'), dtype=np.uint32)
+        b = np.frombuffer(s2.encode('utf-32-le'), dtype=np.uint32)
+        return int(_edit_distance_kernel(a, b, substitution_cost))
+else:
+    _edit_distance = _edit_distance_py
+
+def _fallback_levenshtein_similarity(s1: str, s2: str, score_cutoff: Optional[float] = None) -> float:
+    """Normalized Levenshtein similarity matching RapidFuzz, 0 below score_cutoff"""
+    longest = max(len(s1), len(s2))
+    score = 1.0 if longest == 0 else 1 - _edit_distance(s1, s2) / longest
+    return score if score_cutoff is None or score >= score_cutoff else 0.0
+
+def _fallback_indel_similarity(s1: str, s2: str, score_cutoff: Optional[float] = None) -> float:
+    """Normalized Indel similarity matching RapidFuzz, 0 below score_cutoff"""
+    total = len(s1) + len(s2)
+    score = 1.0 if total == 0 else 1 - _edit_distance(s1, s2, 2) / total
+    return score if score_cutoff is None or score >= score_cutoff else 0.0
+
+if process is not None:
+    _levenshtein_distance = Levenshtein.distance
+    _levenshtein_similarity = Levenshtein.normalized_similarity
+    _indel_similarity = Indel.normalized_similarity
+else:
+    _levenshtein_distance = _edit_distance
+    _levenshtein_similarity = _fallback_levenshtein_similarity
+    _indel_similarity = _fallback_indel_similarity
+
+def _ascii_bytes(text: str):
+    """ASCII text as bytes for RapidFuzz's narrow 8-bit path; anything else unchanged
+    
+    RapidFuzz compares code points, so bytes and str choices can be mixed freely.
+    """
+    return text.encode('ascii') if process is not None and text.isascii() else text
 
 class NameMatcher:
     def __init__(self, data_file: str = "data/names.json"):
         self.data_file = data_file
+        self.tfidf_cache_file = os.path.splitext(data_file)[0] + TFIDF_CACHE_SUFFIX
         self.names = self.load_names()
+        self._names_set = set(self.names)
         self.vectorizer = None
         self.tfidf_matrix = None
+        self._cached_matches = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._compute_matches)
         self._setup_tfidf()
+        self._build_name_index()
     
     def load_names(self) -> List[str]:
         """Load names from JSON file"""
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('names', [])
+            with open(self.data_file, 'rb') as f:
+                data = orjson.loads(f.read())
+                # Drop duplicate names, keeping the first occurrence
+                return list(dict.fromkeys(data.get('names', [])))
         except FileNotFoundError:
             print(f"Warning: {self.data_file} not found. Using default names.")
             return self._get_default_names()
@@ -40,84 +192,214 @@ class NameMatcher:
         ]
     
     def _setup_tfidf(self):
-        """Setup TF-IDF vectorizer"""
-        self.vectorizer = TfidfVectorizer(analyzer='char', ngram_range=(1, 3))
-        self.tfidf_matrix = self.vectorizer.fit_transform(self.names)
+        """Setup TF-IDF vectorizer, reusing the on-disk cache when it matches the names"""
+        if self._load_tfidf_cache():
+            return
+        self.vectorizer = TfidfVectorizer(**TFIDF_PARAMS)
+        # Rows are already L2-normalized, so cosine similarity is a plain sparse dot product
+        self.tfidf_matrix = self.vectorizer.fit_transform(self.names).tocsr()
+        self._save_tfidf_cache()
+    
+    def _tfidf_cache_key(self) -> str:
+        """Fingerprint of the names and settings a cached TF-IDF model must match"""
+        payload = orjson.dumps({"names": self.names, "params": repr(TFIDF_PARAMS)})
+        return hashlib.sha1(payload).hexdigest()
+    
+    def _load_tfidf_cache(self) -> bool:
+        """Load the persisted TF-IDF model, memory-mapping its arrays"""
+        try:
+            cache = joblib.load(self.tfidf_cache_file, mmap_mode='r')
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Warning: ignoring unreadable TF-IDF cache {self.tfidf_cache_file}: {e}")
+            return False
+        if not isinstance(cache, dict) or cache.get("key") != self._tfidf_cache_key():
+            return False
+        self.vectorizer = cache["vectorizer"]
+        self.tfidf_matrix = cache["tfidf_matrix"]
+        return True
+    
+    def _save_tfidf_cache(self):
+        """Persist the TF-IDF model so the next start can skip fitting"""
+        # Only cache next to a real names file, and stay quiet on read-only deployments
+        cache_dir = os.path.dirname(self.tfidf_cache_file) or '.'
+        if not os.path.exists(self.data_file) or not os.access(cache_dir, os.W_OK):
+            return
+        cache = {
+            "key": self._tfidf_cache_key(),
+            "vectorizer": self.vectorizer,
+            "tfidf_matrix": self.tfidf_matrix
+        }
+        # Write then rename: truncating the file in place would break live memory maps
+        tmp_file = f"{self.tfidf_cache_file}.{os.getpid()}.tmp"
+        try:
+            joblib.dump(cache, tmp_file, compress=0)
+            os.replace(tmp_file, self.tfidf_cache_file)
+        except OSError as e:
+            print(f"Warning: could not write TF-IDF cache {self.tfidf_cache_file}: {e}")
+    
+    def _build_name_index(self):
+        """Precompute per-name lookup data used by the scorers"""
+        # Scorer inputs, with ASCII names pre-encoded once instead of per query
+        self._names_bytes = tuple(_ascii_bytes(name) for name in self.names)
+        self._names_lower = tuple(_ascii_bytes(name.lower()) for name in self.names)
+        # Name lengths as flat arrays: indices sorted by length plus the span of each length
+        self._lengths = np.fromiter((len(name) for name in self.names), dtype=np.int32,
+                                    count=len(self.names))
+        self._by_length = np.argsort(self._lengths, kind='stable')
+        self._distinct_lengths, self._length_starts, self._length_counts = np.unique(
+            self._lengths[self._by_length], return_index=True, return_counts=True)
     
     def levenshtein_distance(self, s1: str, s2: str) -> int:
         """Calculate Levenshtein distance between two strings"""
-        if len(s1) < len(s2):
-            return self.levenshtein_distance(s2, s1)
-        
-        if len(s2) == 0:
-            return len(s1)
-        
-        previous_row = range(len(s2) + 1)
-        for i, c1 in enumerate(s1):
-            current_row = [i + 1]
-            for j, c2 in enumerate(s2):
-                insertions = previous_row[j + 1] + 1
-                deletions = current_row[j] + 1
-                substitutions = previous_row[j] + (c1 != c2)
-                current_row.append(min(insertions, deletions, substitutions))
-            previous_row = current_row
-        
-        return previous_row[-1]
+        return _levenshtein_distance(s1, s2)
     
     def normalized_similarity(self, s1: str, s2: str) -> float:
         """Calculate normalized similarity score (0-1)"""
-        distance = self.levenshtein_distance(s1, s2)
-        max_len = max(len(s1), len(s2))
-        if max_len == 0:
-            return 1.0
-        return 1 - (distance / max_len)
+        return _levenshtein_similarity(s1, s2)
+    
+    def _score_all(self, query: str, choices: Sequence, scorer,
+                   score_cutoff: Optional[float] = None) -> np.ndarray:
+        """Score query against every choice in one batched RapidFuzz call"""
+        if score_cutoff is not None:
+            score_cutoff = min(score_cutoff, 1.0)
+        if process is None:
+            return np.fromiter((scorer(query, choice, score_cutoff) for choice in choices),
+                               dtype=np.float64, count=len(choices))
+        workers = -1 if len(choices) >= PARALLEL_MIN_NAMES else 1
+        return process.cdist([_ascii_bytes(query)], choices, scorer=scorer, dtype=np.float64,
+                             workers=workers, score_cutoff=score_cutoff)[0]
+    
+    def _levenshtein_scores(self, query: str, indices: Optional[np.ndarray] = None,
+                            score_cutoff: Optional[float] = None) -> np.ndarray:
+        """Levenshtein similarity of query to every name, or to the names at indices
+        
+        Scores below score_cutoff come back as 0.
+        """
+        names = self._names_bytes if indices is None else [self._names_bytes[i] for i in indices]
+        return self._score_all(query, names, _levenshtein_similarity, score_cutoff)
+    
+    def _combined_scores(self, query: str, indices: Optional[np.ndarray] = None,
+                         score_cutoff: Optional[float] = None) -> np.ndarray:
+        """Weighted sequence + Levenshtein similarity of query to every name, or to the names at indices
+        
+        Scores below score_cutoff may come back too low, but never above score_cutoff.
+        """
+        if indices is None:
+            names, names_lower = self._names_bytes, self._names_lower
+        else:
+            names = [self._names_bytes[i] for i in indices]
+            names_lower = [self._names_lower[i] for i in indices]
+        seq_scores = self._score_all(query.lower(), names_lower, _indel_similarity)
+        lev_cutoff = None
+        if score_cutoff and len(seq_scores):
+            # Any name below this Levenshtein score cannot reach score_cutoff overall
+            lev_cutoff = max(0.0, (score_cutoff - seq_scores.max() * SEQUENCE_WEIGHT) / LEVENSHTEIN_WEIGHT)
+        norm_scores = self._score_all(query, names, _levenshtein_similarity, lev_cutoff)
+        # Both vectors are fresh from the scorers, so weight and sum them in place
+        np.multiply(seq_scores, SEQUENCE_WEIGHT, out=seq_scores)
+        np.multiply(norm_scores, LEVENSHTEIN_WEIGHT, out=norm_scores)
+        return np.add(seq_scores, norm_scores, out=seq_scores)
+    
+    def _length_order(self, query: str, bound_fn) -> Tuple[np.ndarray, np.ndarray]:
+        """Name indices ordered by decreasing length bound, with the bound of each"""
+        if not self.names:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+        bounds = bound_fn(len(query), self._distinct_lengths)
+        order = np.argsort(-bounds, kind='stable')
+        indices = np.concatenate([
+            self._by_length[start:start + count]
+            for start, count in zip(self._length_starts[order], self._length_counts[order])
+        ])
+        return indices, np.repeat(bounds[order], self._length_counts[order])
+    
+    def _bounded_top_k(self, query: str, top_k: Optional[int], score_fn,
+                       bound_fn) -> List[Tuple[str, float]]:
+        """Top-k that stops scoring once the length bound rules out every remaining name"""
+        if top_k is None:
+            return self._top_k(score_fn(query), top_k)
+        if top_k <= 0:
+            return []
+        indices, bounds = self._length_order(query, bound_fn)
+        best_indices = np.empty(0, dtype=np.intp)
+        best_scores = np.empty(0, dtype=np.float64)
+        # Names tying the k-th score can still win on dataset order, so keep them in play
+        cutoff = 0.0
+        for start in range(0, len(indices), SCORE_CHUNK_SIZE):
+            if len(best_scores) == top_k and bounds[start] < cutoff:
+                break
+            chunk = indices[start:start + SCORE_CHUNK_SIZE]
+            best_indices = np.concatenate([best_indices, chunk])
+            best_scores = np.concatenate([best_scores, score_fn(query, chunk, cutoff)])
+            if len(best_scores) > top_k:
+                keep = np.lexsort((best_indices, -best_scores))[:top_k]
+                best_indices, best_scores = best_indices[keep], best_scores[keep]
+            if len(best_scores) == top_k:
+                cutoff = max(0.0, float(best_scores.min()) - TIE_TOLERANCE)
+        return self._top_k(best_scores, top_k, best_indices)
+    
+    def _top_k(self, scores: np.ndarray, top_k: Optional[int],
+               indices: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Return the top_k (name, score) pairs without sorting every score
+        
+        Ties are broken by dataset order, as a stable sort of all names would.
+        """
+        if top_k is None:
+            top_k = len(scores)
+        if top_k <= 0 or len(scores) == 0:
+            return []
+        if top_k < len(scores):
+            # Keep every name tied with the k-th best score; the sort below trims them
+            kth_score = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            idx = np.flatnonzero(scores >= kth_score)
+        else:
+            idx = np.arange(len(scores))
+        name_indices = idx if indices is None else np.asarray(indices)[idx]
+        order = np.lexsort((name_indices, -scores[idx]))[:top_k]
+        return [(self.names[i], float(scores[j])) for i, j in zip(name_indices[order], idx[order])]
     
     def sequence_similarity(self, s1: str, s2: str) -> float:
-        """Calculate similarity using SequenceMatcher"""
-        return SequenceMatcher(None, s1.lower(), s2.lower()).ratio()
+        """Calculate case-insensitive sequence similarity (Indel ratio)"""
+        return _indel_similarity(s1.lower(), s2.lower())
     
-    def tfidf_similarity(self, query: str) -> List[Tuple[str, float]]:
+    def tfidf_similarity(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
         """Calculate similarity using TF-IDF and cosine similarity"""
         try:
             query_vec = self.vectorizer.transform([query])
-            similarities = cosine_similarity(query_vec, self.tfidf_matrix).flatten()
-            results = list(zip(self.names, similarities))
-            return sorted(results, key=lambda x: x[1], reverse=True)
+            similarities = (self.tfidf_matrix @ query_vec.T).toarray().ravel()
+            # float32 rounding can push a perfect match just past 1
+            np.minimum(similarities, 1.0, out=similarities)
+            return self._top_k(similarities, top_k)
         except Exception as e:
             print(f"TF-IDF similarity failed: {e}")
             return []
     
-    def combined_similarity(self, query: str) -> List[Tuple[str, float]]:
+    def combined_similarity(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
         """Combine multiple similarity methods for better accuracy"""
-        results = []
-        
-        for name in self.names:
-            # Weighted combination of different similarity measures
-            seq_score = self.sequence_similarity(query, name)
-            norm_score = self.normalized_similarity(query, name)
-            
-            # Combined score (you can adjust weights)
-            combined_score = (seq_score * 0.6) + (norm_score * 0.4)
-            results.append((name, combined_score))
-        
-        return sorted(results, key=lambda x: x[1], reverse=True)
+        return self._bounded_top_k(query, top_k, self._combined_scores, _combined_length_bound)
     
-    def find_matches(self, query: str, method: str = "combined", top_k: int = 5) -> Dict:
-        """Find matching names based on query"""
+    def _compute_matches(self, query: str, method: str, top_k: int) -> Tuple[Tuple[str, float], ...]:
+        """Run the matching pipeline; results are memoized by find_matches"""
+        # Always rank at least one name so best_match is set even when top_k <= 0
+        top_k = max(top_k, 1)
         if method == "tfidf":
-            matches = self.tfidf_similarity(query)
+            matches = self.tfidf_similarity(query, top_k)
         elif method == "sequence":
-            matches = [(name, self.sequence_similarity(query, name)) for name in self.names]
-            matches = sorted(matches, key=lambda x: x[1], reverse=True)
+            scores = self._score_all(query.lower(), self._names_lower, _indel_similarity)
+            matches = self._top_k(scores, top_k)
         elif method == "levenshtein":
-            matches = [(name, self.normalized_similarity(query, name)) for name in self.names]
-            matches = sorted(matches, key=lambda x: x[1], reverse=True)
+            matches = self._bounded_top_k(query, top_k, self._levenshtein_scores,
+                                          _levenshtein_length_bound)
         else:  # combined
-            matches = self.combined_similarity(query)
+            matches = self.combined_similarity(query, top_k)
         
         # Filter out zero-similarity matches for cleaner output
-        matches = [(name, score) for name, score in matches if score > 0]
-        
+        return tuple((name, score) for name, score in matches if score > 0)
+    
+    def _match_results(self, query: str, method: str, matches: List[Tuple[str, float]],
+                       top_k: int) -> Dict:
+        """Build the result dict returned by find_matches"""
         return {
             "best_match": matches[0] if matches else (None, 0.0),
             "all_matches": matches[:top_k],
@@ -125,19 +407,77 @@ class NameMatcher:
             "method": method
         }
     
+    def find_matches(self, query: str, method: str = "combined", top_k: int = 5) -> Dict:
+        """Find matching names based on query"""
+        matches = list(self._cached_matches(query, method, top_k))
+        return self._match_results(query, method, matches, top_k)
+    
+    def find_matches_multi(self, query: str,
+                           methods: Sequence[str] = ("combined", "sequence", "levenshtein", "tfidf"),
+                           top_k: int = 5) -> Dict[str, Dict]:
+        """Find matches for several methods at once, keyed by method
+        
+        The sequence and Levenshtein score vectors are computed once and shared
+        by every method that needs them. Rankings, ties included, match find_matches.
+        """
+        shared_scores = {}
+        
+        def seq_scores():
+            if "sequence" not in shared_scores:
+                shared_scores["sequence"] = self._score_all(query.lower(), self._names_lower, _indel_similarity)
+            return shared_scores["sequence"]
+        
+        def lev_scores():
+            if "levenshtein" not in shared_scores:
+                shared_scores["levenshtein"] = self._score_all(query, self._names_bytes, _levenshtein_similarity)
+            return shared_scores["levenshtein"]
+        
+        # As in find_matches, rank at least one name so best_match is set
+        candidates = max(top_k, 1)
+        results = {}
+        for method in methods:
+            if method == "tfidf":
+                matches = self.tfidf_similarity(query, candidates)
+            elif method == "sequence":
+                matches = self._top_k(seq_scores(), candidates)
+            elif method == "levenshtein":
+                matches = self._top_k(lev_scores(), candidates)
+            else:  # combined
+                # The shared vectors are reused by other methods, so only the sum gets a new buffer
+                combined_scores = np.multiply(seq_scores(), SEQUENCE_WEIGHT)
+                combined_scores += lev_scores() * LEVENSHTEIN_WEIGHT
+                matches = self._top_k(combined_scores, candidates)
+            
+            matches = [(name, score) for name, score in matches if score > 0]
+            results[method] = self._match_results(query, method, matches, top_k)
+        
+        return results
+    
+    def has_name(self, name: str) -> bool:
+        """Check whether a name is already in the dataset"""
+        return name in self._names_set
+    
     def add_name(self, name: str):
         """Add a new name to the dataset"""
-        if name not in self.names:
+        if name not in self._names_set:
             self.names.append(name)
+            self._names_set.add(name)
             self._save_names()
-            self._setup_tfidf()  # Rebuild TF-IDF matrix
+            if len(self.names) % TFIDF_REFIT_INTERVAL == 0:
+                self._setup_tfidf()  # Periodic refit picks up n-grams unseen so far
+            else:
+                new_row = self.vectorizer.transform([name])
+                self.tfidf_matrix = sp.vstack([self.tfidf_matrix, new_row], format='csr')
+                self._save_tfidf_cache()
+            self._build_name_index()
+            self._cached_matches.cache_clear()
     
     def _save_names(self):
         """Save names to JSON file"""
         os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
         data = {"names": self.names}
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        with open(self.data_file, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
 # Singleton instance
 name_matcher = None
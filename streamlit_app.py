@@ -45,12 +45,17 @@ def load_css():
     </style>
     """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_shared_matcher():
+    """Return one matcher (and TF-IDF matrix) shared by every session in this process"""
+    return get_name_matcher()
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'search_history' not in st.session_state:
         st.session_state.search_history = []
     if 'matcher' not in st.session_state:
-        st.session_state.matcher = get_name_matcher()
+        st.session_state.matcher = get_shared_matcher()
 
 def get_score_color(score):
     """Return color based on similarity score"""
@@ -78,9 +83,10 @@ def display_match_card(name, score, rank):
     </div>
     """, unsafe_allow_html=True)
 
+@st.cache_data(max_entries=64)
 def plot_similarity_scores(matches):
-    """Create a bar chart of similarity scores"""
-    df = pd.DataFrame(matches, columns=['Name', 'Score'])
+    """Create a bar chart of similarity scores (cached per tuple of matches)"""
+    df = pd.DataFrame(list(matches), columns=['Name', 'Score'])
     df['Rank'] = range(1, len(df) + 1)
     
     fig = px.bar(
@@ -101,8 +107,9 @@ def plot_similarity_scores(matches):
     
     return fig
 
+@st.cache_data(max_entries=64)
 def plot_score_distribution(matches):
-    """Create a distribution plot of scores"""
+    """Create a distribution plot of scores (cached per tuple of matches)"""
     scores = [score for _, score in matches]
     
     fig = go.Figure()
@@ -187,7 +194,7 @@ def sidebar_controls():
     st.sidebar.subheader("➕ Add New Name")
     new_name = st.sidebar.text_input("Enter new name to add to dataset")
     if st.sidebar.button("Add Name") and new_name:
-        if new_name not in st.session_state.matcher.names:
+        if not st.session_state.matcher.has_name(new_name):
             st.session_state.matcher.add_name(new_name)
             st.sidebar.success(f"✅ '{new_name}' added to dataset!")
         else:
@@ -224,9 +231,6 @@ def main():
     # Perform search
     if search_clicked and query:
         with st.spinner('🔍 Searching for matches...'):
-            # Simulate loading for better UX
-            time.sleep(0.5)
-            
             results = st.session_state.matcher.find_matches(
                 query, 
                 method=method, 
@@ -263,11 +267,11 @@ def main():
                     st.subheader("📈 Visualizations")
                     
                     # Similarity scores chart
-                    fig1 = plot_similarity_scores(all_matches)
+                    fig1 = plot_similarity_scores(tuple(all_matches))
                     st.plotly_chart(fig1, use_container_width=True)
                     
                     # Score distribution
-                    fig2 = plot_score_distribution(all_matches)
+                    fig2 = plot_score_distribution(tuple(all_matches))
                     st.plotly_chart(fig2, use_container_width=True)
                 
                 # Detailed table
@@ -324,9 +328,9 @@ def main():
             methods = ["combined", "sequence", "levenshtein", "tfidf"]
             comparison_data = []
             
+            all_results = st.session_state.matcher.find_matches_multi(compare_name, methods, top_k=1)
             for method in methods:
-                results = st.session_state.matcher.find_matches(compare_name, method=method, top_k=1)
-                best_match, best_score = results['best_match']
+                best_match, best_score = all_results[method]['best_match']
                 comparison_data.append({
                     'Method': method.title(),
                     'Best Match': best_match,
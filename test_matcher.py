@@ -3,8 +3,16 @@
 Test suite for Name Matching System
 """
 
+import importlib
+import importlib.util
+import os
+import random
+import sys
+import tempfile
 import unittest
-from name_matcher import NameMatcher
+from unittest import mock
+import name_matcher
+from name_matcher import NameMatcher, _edit_distance, _edit_distance_py
 
 class TestNameMatcher(unittest.TestCase):
     
@@ -18,6 +26,38 @@ class TestNameMatcher(unittest.TestCase):
         self.assertEqual(self.matcher.levenshtein_distance("kitten", "sitting"), 3)
         self.assertEqual(self.matcher.levenshtein_distance("", "test"), 4)
     
+    def test_fallback_edit_distance(self):
+        """Test the edit-distance kernels used when RapidFuzz is missing"""
+        for edit_distance in (_edit_distance, _edit_distance_py):
+            self.assertEqual(edit_distance("kitten", "sitting"), 3)
+            self.assertEqual(edit_distance("", "test"), 4)
+            # Substitution cost 2 gives the Indel distance
+            self.assertEqual(edit_distance("kitten", "sitting", 2), 5)
+    
+    @unittest.skipUnless(importlib.util.find_spec("numba"), "numba is not installed")
+    def test_numba_edit_distance(self):
+        """Test the Numba kernel used when RapidFuzz is missing agrees with pure Python"""
+        rng = random.Random(0)
+        pairs = [("kitten", "sitting"), ("", "test"), ("", ""), ("José", "Jose"), ("Zoë", "Zoe"), ("日本", "日本語")]
+        pairs += [("".join(rng.choices("abé日", k=rng.randint(0, 8))),
+                   "".join(rng.choices("abé日", k=rng.randint(0, 8)))) for _ in range(200)]
+        
+        # Load a separate copy of the module with RapidFuzz blocked so the kernel gets compiled.
+        # Numba is imported first because patch.dict drops every module first imported inside it.
+        # The copy keeps the real module name, which Numba records in its on-disk cache.
+        importlib.import_module("numba")
+        spec = importlib.util.spec_from_file_location("name_matcher", name_matcher.__file__)
+        fallback = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(sys.modules, {"rapidfuzz": None, "name_matcher": fallback}):
+            spec.loader.exec_module(fallback)
+            
+            self.assertTrue(hasattr(fallback, "_edit_distance_kernel"))
+            self.assertIsNot(fallback._edit_distance, fallback._edit_distance_py)
+            for s1, s2 in pairs:
+                for substitution_cost in (1, 2):
+                    self.assertEqual(fallback._edit_distance(s1, s2, substitution_cost),
+                                     _edit_distance_py(s1, s2, substitution_cost), (s1, s2, substitution_cost))
+    
     def test_normalized_similarity(self):
         """Test normalized similarity score"""
         self.assertAlmostEqual(self.matcher.normalized_similarity("cat", "cat"), 1.0)
@@ -50,6 +90,78 @@ class TestNameMatcher(unittest.TestCase):
         # Should find similar names
         match_names = [name for name, score in results["all_matches"]]
         self.assertTrue(any("John" in name or "Jon" in name for name in match_names))
+        
+        # Scores stay within [0, 1] despite the float32 matrix
+        for name in self.matcher.names:
+            self.assertLessEqual(self.matcher.find_matches(name, method="tfidf", top_k=1)["best_match"][1], 1.0)
+    
+    def test_find_matches_levenshtein(self):
+        """Test Levenshtein matching method"""
+        results = self.matcher.find_matches("Jonathan", method="levenshtein", top_k=10)
+        
+        self.assertEqual(len(results["all_matches"]), 10)
+        self.assertEqual(results["best_match"][0], "Jonathan")
+        
+        # Ranking must hold across the length-ordered scoring chunks
+        scores = [score for name, score in results["all_matches"]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+    
+    def test_find_matches_multi(self):
+        """Test multi-method matching agrees with single-method matching"""
+        methods = ["combined", "sequence", "levenshtein", "tfidf"]
+        
+        # Gita and Geetha have tied scores, which must be ranked the same way in both paths
+        for query in ["Jonh", "Gita", "Geetha"]:
+            results = self.matcher.find_matches_multi(query, methods, top_k=5)
+            for method in methods:
+                expected = self.matcher.find_matches(query, method=method, top_k=5)
+                self.assertEqual([name for name, _ in results[method]["all_matches"]],
+                                 [name for name, _ in expected["all_matches"]])
+                for (_, score), (_, expected_score) in zip(results[method]["all_matches"], expected["all_matches"]):
+                    self.assertAlmostEqual(score, expected_score)
+    
+    def test_find_matches_zero_top_k(self):
+        """Test top_k=0 returns no matches but still reports the best match"""
+        methods = ["combined", "sequence", "levenshtein", "tfidf"]
+        multi_results = self.matcher.find_matches_multi("John", methods, top_k=0)
+        for method in methods:
+            for results in (self.matcher.find_matches("John", method=method, top_k=0), multi_results[method]):
+                self.assertEqual(results["all_matches"], [])
+                best_match, best_score = results["best_match"]
+                self.assertEqual(best_match, "John")
+                self.assertAlmostEqual(best_score, 1.0, places=5)
+        self.assertEqual(self.matcher.combined_similarity("John", top_k=0), [])
+    
+    def test_find_matches_tie_order(self):
+        """Test tied scores keep dataset order"""
+        results = self.matcher.find_matches("Gita", method="levenshtein", top_k=5)
+        
+        match_names = [name for name, score in results["all_matches"]]
+        self.assertEqual(match_names, ["Gita", "Githa", "Gitu", "Geeta", "Geetha"])
+    
+    def test_tfidf_cache(self):
+        """Test a new matcher reuses the persisted TF-IDF model"""
+        self.assertTrue(os.path.exists(self.matcher.tfidf_cache_file))
+        # Each names file gets its own cache, even when they share a directory
+        self.assertEqual(self.matcher.tfidf_cache_file, os.path.join("data", "names.tfidf_cache.joblib"))
+        
+        other = NameMatcher("data/names.json")
+        self.assertEqual(other.tfidf_matrix.shape, self.matcher.tfidf_matrix.shape)
+        self.assertEqual(other.find_matches("John", method="tfidf"),
+                         self.matcher.find_matches("John", method="tfidf"))
+    
+    def test_load_names_deduplicates(self):
+        """Test duplicate names in the data file are loaded once"""
+        self.assertEqual(len(self.matcher.names), len(set(self.matcher.names)))
+    
+    def test_missing_data_file_writes_nothing(self):
+        """Test a matcher on a missing data file leaves the filesystem alone"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_file = os.path.join(tmp_dir, "sub", "names.json")
+            matcher = NameMatcher(data_file)
+            
+            self.assertGreater(len(matcher.names), 0)
+            self.assertEqual(os.listdir(tmp_dir), [])
     
     def test_add_name(self):
         """Test adding new name to dataset"""
@@ -58,6 +170,15 @@ class TestNameMatcher(unittest.TestCase):
         
         self.assertEqual(len(self.matcher.names), initial_count + 1)
         self.assertIn("TestUniqueName123", self.matcher.names)
+        self.assertTrue(self.matcher.has_name("TestUniqueName123"))
+        
+        # Adding the same name again is a no-op
+        self.matcher.add_name("TestUniqueName123")
+        self.assertEqual(len(self.matcher.names), initial_count + 1)
+        self.assertEqual(self.matcher.tfidf_matrix.shape[0], len(self.matcher.names))
+        
+        results = self.matcher.find_matches("TestUniqueName123", method="tfidf", top_k=1)
+        self.assertEqual(results["best_match"][0], "TestUniqueName123")
 
 def run_tests():
     """Run all tests"""